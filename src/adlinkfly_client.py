@@ -1,23 +1,30 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
-from typing import Optional
-from urllib.parse import urlencode
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 import aiohttp
 import backoff
+import orjson
 
 logger = logging.getLogger(__name__)
 
 
 class AdLinkFlyClient:
-	def __init__(self, base_url: str, api_key: str, api_path: str = "/api") -> None:
+	_cache_max = 10_000
+
+	def __init__(self, base_url: str, api_key: str, api_path: str = "/api", max_inflight: int = 16) -> None:
 		self._base_url = base_url.rstrip('/')
 		self._default_api_key = api_key
 		self._api_path = api_path if api_path.startswith('/') else f"/{api_path}"
+		self._endpoint = f"{self._base_url}{self._api_path}"
 		self._session: Optional[aiohttp.ClientSession] = None
+		# Back-pressure toward AdLinkFly: bounds in-flight requests across all handlers
+		self._sem = asyncio.Semaphore(max_inflight)
+		# LRU of prior results; AdLinkFly returns a stable alias per (key, url)
+		self._cache: "OrderedDict[Tuple[str, str, Optional[str]], str]" = OrderedDict()
 
 	async def __aenter__(self) -> "AdLinkFlyClient":
 		await self.ensure_session()
@@ -28,7 +35,17 @@ class AdLinkFlyClient:
 
 	async def ensure_session(self) -> aiohttp.ClientSession:
 		if self._session is None or self._session.closed:
-			self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+			connector = aiohttp.TCPConnector(
+				limit=100,
+				limit_per_host=30,
+				ttl_dns_cache=300,
+				keepalive_timeout=75,
+			)
+			self._session = aiohttp.ClientSession(
+				timeout=aiohttp.ClientTimeout(total=20),
+				connector=connector,
+				cookie_jar=aiohttp.DummyCookieJar(),
+			)
 		return self._session
 
 	async def close(self) -> None:
@@ -39,30 +56,50 @@ class AdLinkFlyClient:
 	async def shorten(self, long_url: str, alias: Optional[str] = None, api_key_override: Optional[str] = None) -> str:
 		session = await self.ensure_session()
 		api_key = api_key_override or self._default_api_key
-		query = {"api": api_key, "url": long_url}
+		cache_key = (api_key, long_url, alias)
+		cached = self._cache.get(cache_key)
+		if cached is not None:
+			self._cache.move_to_end(cache_key)
+			return cached
+		params = [("api", api_key), ("url", long_url)]
 		if alias:
-			query["alias"] = alias
-		endpoint = f"{self._base_url}{self._api_path}"
-		url = f"{endpoint}?{urlencode(query)}"
-
-		logger.debug("AdLinkFly request: %s", url)
-		async with session.get(url, headers={"Accept": "application/json"}) as resp:
-			text = await resp.text()
-			logger.debug("AdLinkFly response status=%s body=%s", resp.status, text)
-			if resp.status >= 500:
-				raise aiohttp.ClientError(f"Server error {resp.status}")
-			if resp.status >= 400:
-				raise ValueError(f"AdLinkFly returned {resp.status}: {text}")
-
-			try:
-				data = json.loads(text)
-			except json.JSONDecodeError:
-				if text.strip().startswith("http"):
-					return text.strip()
-				raise ValueError("Unexpected response format from AdLinkFly")
+			params.append(("alias", alias))
+
+		debug = logger.isEnabledFor(logging.DEBUG)
+		if debug:
+			logger.debug("AdLinkFly request: %s url=%s", self._endpoint, long_url)
+		async with self._sem:
+			async with session.get(self._endpoint, params=params, headers={"Accept": "application/json"}) as resp:
+				if resp.status >= 500:
+					raise aiohttp.ClientError(f"Server error {resp.status}")
+				if resp.status >= 400:
+					text = await resp.text()
+					raise ValueError(f"AdLinkFly returned {resp.status}: {text}")
+
+				body = await resp.read()
 
+		try:
+			data = orjson.loads(body)
+		except orjson.JSONDecodeError:
+			# Some installs reply with the bare short URL as plain text
+			text = body.decode('utf-8', 'replace').strip()
+			if text.startswith("http"):
+				return self._remember(cache_key, text)
+			raise ValueError("Unexpected response format from AdLinkFly")
+
+		if debug:
+			logger.debug("AdLinkFly response body=%s", data)
+
+		if isinstance(data, dict):
 			for key in ("shortenedUrl", "short", "short_url", "url"):
 				if key in data and isinstance(data[key], str) and data[key].startswith("http"):
-					return data[key]
+					return self._remember(cache_key, data[key])
+
+		raise ValueError(f"Unable to parse short URL from response: {data}")
 
-			raise ValueError(f"Unable to parse short URL from response: {data}")
+	def _remember(self, cache_key: Tuple[str, str, Optional[str]], short_url: str) -> str:
+		self._cache[cache_key] = short_url
+		self._cache.move_to_end(cache_key)
+		if len(self._cache) > self._cache_max:
+			self._cache.popitem(last=False)
+		return short_url
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
 import re
 import time
+from collections import deque
 from io import BytesIO
 from typing import Optional, List
 
@@ -16,34 +18,60 @@ from .config import Settings
 from .adlinkfly_client import AdLinkFlyClient
 from .storage import Storage
 
-URL_REGEX = re.compile(r"https?://[^\s]+", re.IGNORECASE)
+# Group 1 captures the host so domain filtering needs no second regex pass
+URL_REGEX = re.compile(r"https?://([^\s/]+)(?:/[^\s]*)?", re.IGNORECASE)
 
 
-def _user_allowed(user_id: int, allowed: Optional[list[int]]) -> bool:
+def _user_allowed(user_id: int, allowed: Optional[frozenset[int]]) -> bool:
 	return allowed is None or user_id in allowed
 
 
-def _domain_from_url(url: str) -> Optional[str]:
-	m = re.match(r"https?://([^/]+)", url, re.IGNORECASE)
-	return m.group(1).lower() if m else None
-
-
 class RateLimiter:
-	def __init__(self, per_minute: int) -> None:
+	_max_users = 10_000
+	_bucket_seconds = 10.0
+	_num_buckets = 6
+
+	def __init__(self, per_minute: int, global_per_minute: int = 0) -> None:
 		self.per_minute = per_minute
-		self.user_to_events: dict[int, List[float]] = {}
+		# user_id -> (tokens, last_refill); a token bucket refilled at per_minute/60 per second
+		self.user_to_bucket: dict[int, tuple[float, float]] = {}
+		# Global sliding window: a ring of 10s buckets covering the last minute
+		self.global_per_minute = global_per_minute
+		self._global_buckets: deque[int] = deque([0] * self._num_buckets, maxlen=self._num_buckets)
+		self._global_bucket_start = time.monotonic()
 
 	def allow(self, user_id: int) -> bool:
-		now = time.time()
-		window_start = now - 60
-		events = [t for t in self.user_to_events.get(user_id, []) if t >= window_start]
-		if len(events) >= self.per_minute:
-			self.user_to_events[user_id] = events
+		now = time.monotonic()
+		if self.global_per_minute and not self._global_allow(now):
 			return False
-		events.append(now)
-		self.user_to_events[user_id] = events
+		tokens, last = self.user_to_bucket.get(user_id, (float(self.per_minute), now))
+		tokens = min(float(self.per_minute), tokens + (now - last) * (self.per_minute / 60.0))
+		if tokens < 1.0:
+			# No store needed: the refill is recomputed from the stored (tokens, last)
+			return False
+		if len(self.user_to_bucket) >= self._max_users and user_id not in self.user_to_bucket:
+			self._evict_idle(now)
+		self.user_to_bucket[user_id] = (tokens - 1.0, now)
 		return True
 
+	def _global_allow(self, now: float) -> bool:
+		advance = int((now - self._global_bucket_start) / self._bucket_seconds)
+		if advance:
+			for _ in range(min(advance, self._num_buckets)):
+				self._global_buckets.popleft()
+				self._global_buckets.append(0)
+			self._global_bucket_start += advance * self._bucket_seconds
+		if sum(self._global_buckets) >= self.global_per_minute:
+			return False
+		self._global_buckets[-1] += 1
+		return True
+
+	def _evict_idle(self, now: float) -> None:
+		# Drop users whose buckets have fully refilled (idle for >= a minute)
+		idle = [uid for uid, (_, last) in self.user_to_bucket.items() if now - last >= 60.0]
+		for uid in idle:
+			del self.user_to_bucket[uid]
+
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 	settings: Settings = context.application.bot_data["settings"]
@@ -142,16 +170,38 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 	await query.answer()
 	data = query.data or ""
 	if data.startswith("qr|"):
-		url = data.split("|", 1)[1]
-		await send_qr(update, context, url)
+		qr_id = data.split("|", 1)[1]
+		url = context.application.bot_data.get("qr_ids", {}).get(qr_id)
+		if url:
+			await send_qr(update, context, url)
+
+
+# Encoded QR PNGs keyed by URL; popular short links are requested repeatedly
+_QR_CACHE: dict[str, bytes] = {}
+_QR_CACHE_MAX = 512
+
+# Cap on the callback-id -> URL map kept in bot_data
+_QR_ID_MAX = 4096
+
+
+def _render_qr_png(url: str) -> bytes:
+	qr = qrcode.QRCode(box_size=4, border=2)
+	qr.add_data(url)
+	qr.make(fit=True)
+	buf = BytesIO()
+	qr.make_image().save(buf, format="PNG")
+	return buf.getvalue()
 
 
 async def send_qr(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str) -> None:
-	img = qrcode.make(url)
-	bio = BytesIO()
-	img.save(bio, format="PNG")
-	bio.seek(0)
-	await update.effective_chat.send_photo(photo=bio, caption=url)
+	png = _QR_CACHE.get(url)
+	if png is None:
+		# PIL rasterization is CPU-bound; keep it off the event loop
+		png = await asyncio.to_thread(_render_qr_png, url)
+		if len(_QR_CACHE) >= _QR_CACHE_MAX:
+			_QR_CACHE.pop(next(iter(_QR_CACHE)))
+		_QR_CACHE[url] = png
+	await update.effective_chat.send_photo(photo=BytesIO(png), caption=url)
 
 
 async def cmd_short(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -165,7 +215,11 @@ async def cmd_short(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 	if not args:
 		await update.message.reply_text("Usage: /short <url> [alias]")
 		return
-	await process_urls(update, context, [args[0]], alias=args[1] if len(args) > 1 else None)
+	m = URL_REGEX.match(args[0])
+	if not m:
+		await update.message.reply_text("Usage: /short <url> [alias]")
+		return
+	await process_urls(update, context, [(m.group(0), m.group(1).lower())], alias=args[1] if len(args) > 1 else None)
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -174,13 +228,17 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 		return
 	if not _user_allowed(update.effective_user.id, settings.allowed_user_ids):
 		return
-	urls = URL_REGEX.findall(update.message.text)
+	urls: List[tuple[str, str]] = []
+	for m in URL_REGEX.finditer(update.message.text):
+		urls.append((m.group(0), m.group(1).lower()))
+		if len(urls) >= settings.max_batch:
+			break
 	if not urls:
 		return
 	await process_urls(update, context, urls)
 
 
-async def process_urls(update: Update, context: ContextTypes.DEFAULT_TYPE, urls: List[str], alias: Optional[str] = None) -> None:
+async def process_urls(update: Update, context: ContextTypes.DEFAULT_TYPE, urls: List[tuple[str, str]], alias: Optional[str] = None) -> None:
 	settings: Settings = context.application.bot_data["settings"]
 	storage: Storage = context.application.bot_data["storage"]
 	ratelimiter: RateLimiter = context.application.bot_data["ratelimiter"]
@@ -195,13 +253,12 @@ async def process_urls(update: Update, context: ContextTypes.DEFAULT_TYPE, urls:
 
 	user_api_key = await storage.get_user_api_key(uid)
 
-	# Filter domains
+	# Filter domains on the host captured during extraction
 	filtered: List[str] = []
-	for u in urls:
-		d = _domain_from_url(u)
-		if settings.whitelist_domains and d not in settings.whitelist_domains:
+	for u, host in urls:
+		if settings.whitelist_domains and host not in settings.whitelist_domains:
 			continue
-		if settings.blacklist_domains and d in settings.blacklist_domains:
+		if settings.blacklist_domains and host in settings.blacklist_domains:
 			continue
 		filtered.append(u)
 	if not filtered:
@@ -211,28 +268,37 @@ async def process_urls(update: Update, context: ContextTypes.DEFAULT_TYPE, urls:
 	batch = filtered[: settings.max_batch]
 	await update.message.reply_text(f"Processing {len(batch)} URL(s)... ⏳")
 
+	client: AdLinkFlyClient = context.application.bot_data["adlinkfly_client"]
 	results: List[str] = []
-	async with AdLinkFlyClient(settings.adlinkfly_base_url, settings.adlinkfly_api_key, settings.adlinkfly_api_path) as client:
-		for u in batch:
-			try:
-				short_url = await client.shorten(u, alias, api_key_override=user_api_key)
-				results.append(short_url)
-				await storage.record_link(uid, u, short_url, alias)
-			except Exception as e:  # noqa: BLE001
-				results.append(f"Failed for {u}: {e}")
-
-	# Build reply with buttons
+	results_raw = await asyncio.gather(
+		*[client.shorten(u, alias, api_key_override=user_api_key) for u in batch],
+		return_exceptions=True,
+	)
+	recorded: List[tuple[str, str, Optional[str]]] = []
+	for u, r in zip(batch, results_raw):
+		if isinstance(r, Exception):
+			results.append(f"Failed for {u}: {r}")
+		else:
+			results.append(r)
+			recorded.append((u, r, alias))
+	await storage.record_links(uid, recorded)
+
+	# Build reply with buttons; callback_data is capped at 64 bytes, so buttons
+	# carry a short digest that maps back to the URL via bot_data
+	qr_ids: dict[str, str] = context.application.bot_data.setdefault("qr_ids", {})
 	lines: List[str] = []
 	keyboard_rows: List[List[InlineKeyboardButton]] = []
 	for s in results:
+		lines.append(s)
 		if s.startswith("http"):
-			lines.append(s)
+			qr_id = hashlib.blake2b(s.encode(), digest_size=8).hexdigest()
+			if qr_id not in qr_ids and len(qr_ids) >= _QR_ID_MAX:
+				qr_ids.pop(next(iter(qr_ids)))
+			qr_ids[qr_id] = s
 			keyboard_rows.append([
 				InlineKeyboardButton(text="Open", url=s),
-				InlineKeyboardButton(text="QR", callback_data=f"qr|{s}"),
+				InlineKeyboardButton(text="QR", callback_data=f"qr|{qr_id}"),
 			])
-		else:
-			lines.append(s)
 
 	text = "\n".join(lines)
 	reply_markup = InlineKeyboardMarkup(keyboard_rows) if keyboard_rows else None
@@ -248,9 +314,9 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 	if not match:
 		return
 	url = match.group(0)
+	client: AdLinkFlyClient = context.application.bot_data["adlinkfly_client"]
 	try:
-		async with AdLinkFlyClient(settings.adlinkfly_base_url, settings.adlinkfly_api_key, settings.adlinkfly_api_path) as client:
-			short_url = await client.shorten(url)
+		short_url = await client.shorten(url)
 	except Exception:
 		return
 
@@ -270,12 +336,21 @@ async def main_async() -> None:
 	storage = Storage()
 	await storage.init()
 
-	ratelimiter = RateLimiter(settings.rate_limit_per_min)
+	ratelimiter = RateLimiter(settings.rate_limit_per_min, settings.global_rate_limit_per_min)
 
-	application: Application = ApplicationBuilder().token(settings.telegram_bot_token).build()
+	client = AdLinkFlyClient(
+		settings.adlinkfly_base_url,
+		settings.adlinkfly_api_key,
+		settings.adlinkfly_api_path,
+		max_inflight=settings.adlinkfly_max_inflight,
+	)
+	await client.ensure_session()
+
+	application: Application = ApplicationBuilder().token(settings.telegram_bot_token).concurrent_updates(True).build()
 	application.bot_data["settings"] = settings
 	application.bot_data["storage"] = storage
 	application.bot_data["ratelimiter"] = ratelimiter
+	application.bot_data["adlinkfly_client"] = client
 
 	application.add_handler(CommandHandler("start", cmd_start))
 	application.add_handler(CommandHandler("help", cmd_help))
@@ -306,9 +381,16 @@ async def main_async() -> None:
 	finally:
 		await application.stop()
 		await application.shutdown()
+		await client.close()
+		await storage.close()
 
 
 def main() -> None:
+	try:
+		import uvloop
+		uvloop.install()
+	except ImportError:
+		pass
 	asyncio.run(main_async())
 
 
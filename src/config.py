@@ -1,11 +1,11 @@
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 
 from dotenv import load_dotenv
 
 
-def _parse_int_list(raw: str) -> Optional[List[int]]:
+def _parse_int_list(raw: str) -> Optional[FrozenSet[int]]:
 	values = [v.strip() for v in raw.split(',') if v.strip()]
 	if not values:
 		return None
@@ -15,11 +15,11 @@ def _parse_int_list(raw: str) -> Optional[List[int]]:
 			ids.append(int(v))
 		except ValueError:
 			continue
-	return ids or None
+	return frozenset(ids) if ids else None
 
 
-def _parse_str_list(raw: str) -> Optional[List[str]]:
-	values = [v.strip().lower() for v in raw.split(',') if v.strip()]
+def _parse_str_list(raw: str) -> Optional[FrozenSet[str]]:
+	values = frozenset(v.strip().lower() for v in raw.split(',') if v.strip())
 	return values or None
 
 
@@ -29,12 +29,14 @@ class Settings:
 	adlinkfly_base_url: str
 	adlinkfly_api_key: str
 	adlinkfly_api_path: str
-	allowed_user_ids: Optional[List[int]]
-	admin_user_ids: Optional[List[int]]
+	adlinkfly_max_inflight: int
+	allowed_user_ids: Optional[FrozenSet[int]]
+	admin_user_ids: Optional[FrozenSet[int]]
 	rate_limit_per_min: int
+	global_rate_limit_per_min: int
 	max_batch: int
-	blacklist_domains: Optional[List[str]]
-	whitelist_domains: Optional[List[str]]
+	blacklist_domains: Optional[FrozenSet[str]]
+	whitelist_domains: Optional[FrozenSet[str]]
 	inline_mode: bool
 	log_level: str
 
@@ -47,9 +49,11 @@ class Settings:
 		adlinkfly_base_url = os.getenv("ADLINKFLY_BASE_URL", "").strip().rstrip('/')
 		adlinkfly_api_key = os.getenv("ADLINKFLY_API_KEY", "").strip()
 		adlinkfly_api_path = os.getenv("ADLINKFLY_API_PATH", "/api").strip()
+		adlinkfly_max_inflight = int(os.getenv("ADLINKFLY_MAX_INFLIGHT", "16"))
 		allowed_user_ids = _parse_int_list(os.getenv("ALLOWED_USER_IDS", ""))
 		admin_user_ids = _parse_int_list(os.getenv("ADMIN_USER_IDS", ""))
 		rate_limit_per_min = int(os.getenv("RATE_LIMIT_PER_MIN", "20"))
+		global_rate_limit_per_min = int(os.getenv("GLOBAL_RATE_LIMIT_PER_MIN", "0"))
 		max_batch = int(os.getenv("MAX_BATCH", "5"))
 		blacklist_domains = _parse_str_list(os.getenv("BLACKLIST_DOMAINS", ""))
 		whitelist_domains = _parse_str_list(os.getenv("WHITELIST_DOMAINS", ""))
@@ -68,9 +72,11 @@ class Settings:
 			adlinkfly_base_url=adlinkfly_base_url,
 			adlinkfly_api_key=adlinkfly_api_key,
 			adlinkfly_api_path=adlinkfly_api_path,
+			adlinkfly_max_inflight=adlinkfly_max_inflight,
 			allowed_user_ids=allowed_user_ids,
 			admin_user_ids=admin_user_ids,
 			rate_limit_per_min=rate_limit_per_min,
+			global_rate_limit_per_min=global_rate_limit_per_min,
 			max_batch=max_batch,
 			blacklist_domains=blacklist_domains,
 			whitelist_domains=whitelist_domains,
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import aiosqlite
 from typing import Optional, List, Tuple
 import time
 
 SCHEMA = """
-PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS users (
 	user_id INTEGER PRIMARY KEY,
 	banned INTEGER NOT NULL DEFAULT 0,
@@ -20,28 +20,46 @@ CREATE TABLE IF NOT EXISTS links (
 	created_at INTEGER NOT NULL,
 	FOREIGN KEY(user_id) REFERENCES users(user_id)
 );
+CREATE INDEX IF NOT EXISTS idx_links_user ON links(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_links_created ON links(created_at);
 """
 
 
 class Storage:
 	def __init__(self, db_path: str = "bot.db") -> None:
 		self._db_path = db_path
+		self._db: Optional[aiosqlite.Connection] = None
+		self._lock = asyncio.Lock()
+		# Per-user lookups happen on every message; cache them and invalidate on write
+		self._api_key_cache: dict[int, Optional[str]] = {}
+		self._banned_cache: dict[int, bool] = {}
 
 	async def init(self) -> None:
-		async with aiosqlite.connect(self._db_path) as db:
-			await db.executescript(SCHEMA)
-			# Ensure users.api_key exists
-			cols = []
-			async with db.execute("PRAGMA table_info(users)") as cur:
-				async for row in cur:
-					cols.append(row[1])
-			if "api_key" not in cols:
-				await db.execute("ALTER TABLE users ADD COLUMN api_key TEXT")
-			await db.commit()
+		self._db = await aiosqlite.connect(self._db_path)
+		await self._db.execute("PRAGMA journal_mode=WAL")
+		await self._db.execute("PRAGMA synchronous=NORMAL")
+		await self._db.execute("PRAGMA temp_store=MEMORY")
+		await self._db.execute("PRAGMA cache_size=-20000")
+		await self._db.executescript(SCHEMA)
+		# Ensure users.api_key exists
+		cols = []
+		async with self._db.execute("PRAGMA table_info(users)") as cur:
+			async for row in cur:
+				cols.append(row[1])
+		if "api_key" not in cols:
+			await self._db.execute("ALTER TABLE users ADD COLUMN api_key TEXT")
+		await self._db.execute("ANALYZE")
+		await self._db.commit()
+
+	async def close(self) -> None:
+		if self._db is not None:
+			await self._db.close()
+			self._db = None
 
 	async def upsert_user(self, user_id: int) -> None:
 		now = int(time.time())
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			await db.execute(
 				"INSERT INTO users(user_id, banned, created_at) VALUES(?, 0, ?) ON CONFLICT(user_id) DO NOTHING",
 				(user_id, now),
@@ -49,46 +67,76 @@ class Storage:
 			await db.commit()
 
 	async def is_banned(self, user_id: int) -> bool:
-		async with aiosqlite.connect(self._db_path) as db:
+		cached = self._banned_cache.get(user_id)
+		if cached is not None:
+			return cached
+		async with self._lock:
+			db = self._db
 			async with db.execute("SELECT banned FROM users WHERE user_id=?", (user_id,)) as cur:
 				row = await cur.fetchone()
-				return bool(row and row[0])
+				banned = bool(row and row[0])
+		self._banned_cache[user_id] = banned
+		return banned
 
 	async def set_banned(self, user_id: int, banned: bool) -> None:
 		now = int(time.time())
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			await db.execute("INSERT INTO users(user_id, banned, created_at) VALUES(?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET banned=excluded.banned", (user_id, 1 if banned else 0, now))
 			await db.commit()
+		self._banned_cache[user_id] = banned
 
 	async def set_user_api_key(self, user_id: int, api_key: str) -> None:
 		now = int(time.time())
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			await db.execute(
 				"INSERT INTO users(user_id, banned, created_at, api_key) VALUES(?, 0, ?, ?) ON CONFLICT(user_id) DO UPDATE SET api_key=excluded.api_key",
 				(user_id, now, api_key),
 			)
 			await db.commit()
+		self._api_key_cache[user_id] = api_key
 
 	async def get_user_api_key(self, user_id: int) -> Optional[str]:
-		async with aiosqlite.connect(self._db_path) as db:
+		if user_id in self._api_key_cache:
+			return self._api_key_cache[user_id]
+		async with self._lock:
+			db = self._db
 			async with db.execute("SELECT api_key FROM users WHERE user_id=?", (user_id,)) as cur:
 				row = await cur.fetchone()
-				return row[0] if row and row[0] else None
+				key = row[0] if row and row[0] else None
+		self._api_key_cache[user_id] = key
+		return key
 
 	async def record_link(self, user_id: int, long_url: str, short_url: str, alias: Optional[str]) -> None:
 		now = int(time.time())
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			await db.execute("INSERT INTO links(user_id, long_url, short_url, alias, created_at) VALUES(?,?,?,?,?)", (user_id, long_url, short_url, alias, now))
 			await db.commit()
 
+	async def record_links(self, user_id: int, rows: List[Tuple[str, str, Optional[str]]]) -> None:
+		if not rows:
+			return
+		now = int(time.time())
+		async with self._lock:
+			db = self._db
+			await db.executemany(
+				"INSERT INTO links(user_id, long_url, short_url, alias, created_at) VALUES(?,?,?,?,?)",
+				[(user_id, long_url, short_url, alias, now) for long_url, short_url, alias in rows],
+			)
+			await db.commit()
+
 	async def user_stats(self, user_id: int) -> Tuple[int, Optional[str]]:
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			async with db.execute("SELECT COUNT(*), MAX(created_at) FROM links WHERE user_id=?", (user_id,)) as cur:
 				row = await cur.fetchone()
 				return int(row[0] or 0), str(row[1]) if row and row[1] else None
 
 	async def global_stats(self) -> Tuple[int, int]:
-		async with aiosqlite.connect(self._db_path) as db:
+		async with self._lock:
+			db = self._db
 			async with db.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM links") as cur:
 				row = await cur.fetchone()
 				return int(row[0] or 0), int(row[1] or 0)